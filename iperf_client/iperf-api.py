@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+from flask import Flask, request, jsonify
+import threading
+import iperf3
+
+app = Flask(__name__)
+
+IPERF_SERVER = "172.21.0.3"
+
+# Longest accepted test. iperf3-python captures libiperf's JSON in a pipe it
+# never drains, so longer tests overflow the 64 KiB pipe buffer and block
+# client.run() forever
+MAX_DURATION = 60
+
+# libiperf keeps per-process test state, so run one test at a time; a test
+# is bounded by MAX_DURATION so the lock is never held indefinitely
+test_lock = threading.Lock()
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Health check endpoint"""
+    return jsonify({"status": "healthy"})
+
+@app.route('/run', methods=['POST'])
+def run_test():
+    """Run an iperf3 client test and return iperf3's JSON result"""
+    try:
+        duration = int(request.args.get('duration', 10))
+    except ValueError:
+        return jsonify({"success": False, "error": "duration must be an integer"}), 400
+    if not 0 < duration <= MAX_DURATION:
+        return jsonify({"success": False, "error": f"duration must be between 1 and {MAX_DURATION} seconds"}), 400
+    server = request.args.get('server', IPERF_SERVER)
+
+    with test_lock:
+        client = iperf3.Client()
+        client.server_hostname = server
+        client.duration = duration
+        client.json_output = True
+        result = client.run()
+
+    if result is None:
+        return jsonify({"success": False, "error": "iperf3 produced no result"}), 500
+    if result.error:
+        return jsonify({"success": False, "error": result.error}), 500
+    return jsonify(result.json)
+
+if __name__ == '__main__':
+    print("iperf3 Client API Starting...")
+    print("Available at http://0.0.0.0:5001")
+    app.run(host='0.0.0.0', port=5001, debug=False)
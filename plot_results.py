@@ -4,8 +4,16 @@ Traffic Shaping Policy Results Visualization
 Generates charts from policy_test_results.csv
 """
 
+import numpy as np
 import pandas as pd
+import pyarrow.csv as pv
+import matplotlib
+matplotlib.use('Agg')  # Figures are only saved to disk, never shown
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.collections import PatchCollection
+from matplotlib.patches import Rectangle
 import seaborn as sns
 import sys
 from pathlib import Path
@@ -14,10 +22,32 @@ from pathlib import Path
 sns.set_theme(style="whitegrid")
 plt.rcParams['figure.figsize'] = (14, 10)
 
+# Sentinel values written by run_all_tests.sh for failed/skipped policies
+NULL_VALUES = ['ERROR', 'N/A', '']
+
+# Arrow parses the CSV in parallel blocks; 16 MB keeps each block large
+# enough to amortize per-block overhead on big result files
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+NUMERIC_COLS = ['Bitrate_Sender_Mbps', 'Bitrate_Receiver_Mbps',
+                'Transfer_Sender_MB', 'Transfer_Receiver_MB', 'Retransmissions']
+
+# Columns converted to numeric in prepare() (Avg_RTT_ms is optional)
+METRIC_COLS = NUMERIC_COLS + ['Avg_RTT_ms']
+
+# Above this many rows, repeated runs are averaged per policy before plotting
+MAX_PLOT_ROWS = 500
+
 def load_data(csv_file):
     """Load and prepare the CSV data"""
     try:
-        df = pd.read_csv(csv_file)
+        table = pv.read_csv(
+            csv_file,
+            read_options=pv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            convert_options=pv.ConvertOptions(null_values=NULL_VALUES,
+                                              strings_can_be_null=True)
+        )
+        df = table.to_pandas()
         print(f"Loaded {len(df)} policy test results from {csv_file}")
         print(f"Columns: {', '.join(df.columns)}")
         return df
@@ -29,107 +59,120 @@ def load_data(csv_file):
         print(f"Error loading CSV: {e}")
         sys.exit(1)
 
-def create_plots(df, output_prefix='policy_results'):
-    """Create visualizations of the test results"""
+def prepare(df):
+    """Drop failed tests, convert metrics to numeric and add Efficiency"""
+    # Filter out error rows (ERROR/N/A are loaded as nulls)
+    df_clean = df.dropna(subset=['Bitrate_Sender_Mbps'])
 
-    # Filter out error rows
-    df_clean = df[df['Bitrate_Sender_Mbps'] != 'ERROR'].copy()
-    df_clean = df_clean[df_clean['Bitrate_Sender_Mbps'] != 'N/A'].copy()
+    # Convert to numeric in a single call; ERROR/N/A are already nulls and any
+    # other stray token becomes NaN instead of aborting the run
+    cols = [col for col in METRIC_COLS if col in df_clean.columns]
+    df_clean = df_clean.assign(**df_clean[cols].apply(pd.to_numeric, errors='coerce'))
 
-    # Convert to numeric
-    numeric_cols = ['Bitrate_Sender_Mbps', 'Bitrate_Receiver_Mbps',
-                    'Transfer_Sender_MB', 'Transfer_Receiver_MB', 'Retransmissions']
-    for col in numeric_cols:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
+    # Receiver/Sender ratio, shared by the plots and the summary
+    df_clean['Efficiency'] = df_clean['Bitrate_Receiver_Mbps'] / df_clean['Bitrate_Sender_Mbps'] * 100
 
     print(f"\nProcessing {len(df_clean)} valid test results")
+    return df_clean
+
+def aggregate_runs(df_clean):
+    """Average repeated runs per policy when there are too many rows to plot"""
+    if len(df_clean) <= MAX_PLOT_ROWS:
+        return df_clean
+
+    df_agg = df_clean.groupby('Policy', sort=False).mean(numeric_only=True).reset_index()
+    print(f"Aggregated {len(df_clean)} results into {len(df_agg)} policies for plotting")
+    return df_agg
+
+def add_bars(ax, x, heights, width, **kwargs):
+    """Draw a series of bars as a single PatchCollection artist"""
+    corners = np.asarray(x) - width/2
+    patches = [Rectangle((xi, 0), width, h) for xi, h in zip(corners, heights)]
+    collection = PatchCollection(patches, **kwargs)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    ax.set_ylim(bottom=0)
+    return collection
+
+def create_plots(df_clean, output_prefix='policy_results', png_table=False):
+    """Create visualizations of the test results"""
+
+    df_clean = aggregate_runs(df_clean)
 
     # Create figure with subplots
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12), sharex=True, constrained_layout=True)
     fig.suptitle('Traffic Shaping Policy Performance Analysis', fontsize=16, fontweight='bold')
 
+    # Bar positions and labels shared by all panels
+    policies = df_clean['Policy'].to_numpy()
+    x = np.arange(len(df_clean))
+    width = 0.35
+    left = x - width/2
+    right = x + width/2
+
     # Plot 1: Bitrate Comparison (Sender vs Receiver)
     ax1 = axes[0, 0]
-    x = range(len(df_clean))
-    width = 0.35
-    ax1.bar([i - width/2 for i in x], df_clean['Bitrate_Sender_Mbps'],
-            width, label='Sender', alpha=0.8, color='steelblue')
-    ax1.bar([i + width/2 for i in x], df_clean['Bitrate_Receiver_Mbps'],
-            width, label='Receiver', alpha=0.8, color='coral')
-    ax1.set_xlabel('Policy', fontweight='bold')
+    add_bars(ax1, left, df_clean['Bitrate_Sender_Mbps'],
+             width, label='Sender', alpha=0.8, facecolor='steelblue')
+    add_bars(ax1, right, df_clean['Bitrate_Receiver_Mbps'],
+             width, label='Receiver', alpha=0.8, facecolor='coral')
     ax1.set_ylabel('Bitrate (Mbps)', fontweight='bold')
     ax1.set_title('Bitrate: Sender vs Receiver', fontweight='bold')
-    ax1.set_xticks(x)
-    ax1.set_xticklabels(df_clean['Policy'], rotation=45, ha='right')
     ax1.legend()
     ax1.grid(axis='y', alpha=0.3)
 
     # Plot 2: Transfer Volume
     ax2 = axes[0, 1]
-    ax2.bar([i - width/2 for i in x], df_clean['Transfer_Sender_MB'],
-            width, label='Sender', alpha=0.8, color='green')
-    ax2.bar([i + width/2 for i in x], df_clean['Transfer_Receiver_MB'],
-            width, label='Receiver', alpha=0.8, color='lightgreen')
-    ax2.set_xlabel('Policy', fontweight='bold')
+    add_bars(ax2, left, df_clean['Transfer_Sender_MB'],
+             width, label='Sender', alpha=0.8, facecolor='green')
+    add_bars(ax2, right, df_clean['Transfer_Receiver_MB'],
+             width, label='Receiver', alpha=0.8, facecolor='lightgreen')
     ax2.set_ylabel('Transfer (MB)', fontweight='bold')
     ax2.set_title('Data Transfer Volume (10 second test)', fontweight='bold')
-    ax2.set_xticks(x)
-    ax2.set_xticklabels(df_clean['Policy'], rotation=45, ha='right')
     ax2.legend()
     ax2.grid(axis='y', alpha=0.3)
 
     # Plot 3: Retransmissions
     ax3 = axes[1, 0]
     bars = ax3.bar(x, df_clean['Retransmissions'], color='crimson', alpha=0.7)
-    ax3.set_xlabel('Policy', fontweight='bold')
     ax3.set_ylabel('Retransmissions', fontweight='bold')
     ax3.set_title('TCP Retransmissions (Packet Loss Indicator)', fontweight='bold')
-    ax3.set_xticks(x)
-    ax3.set_xticklabels(df_clean['Policy'], rotation=45, ha='right')
     ax3.grid(axis='y', alpha=0.3)
 
     # Add value labels on retransmission bars
-    for i, bar in enumerate(bars):
-        height = bar.get_height()
-        ax3.text(bar.get_x() + bar.get_width()/2., height,
-                f'{int(height)}',
-                ha='center', va='bottom', fontsize=9)
+    ax3.bar_label(bars, fmt='%d', padding=2, fontsize=9)
 
     # Plot 4: Efficiency (Receiver/Sender ratio)
     ax4 = axes[1, 1]
-    efficiency = (df_clean['Bitrate_Receiver_Mbps'] / df_clean['Bitrate_Sender_Mbps'] * 100).fillna(0)
+    efficiency = df_clean['Efficiency'].fillna(0)
     bars = ax4.bar(x, efficiency, color='purple', alpha=0.7)
-    ax4.set_xlabel('Policy', fontweight='bold')
     ax4.set_ylabel('Efficiency (%)', fontweight='bold')
     ax4.set_title('Transfer Efficiency (Receiver/Sender %)', fontweight='bold')
-    ax4.set_xticks(x)
-    ax4.set_xticklabels(df_clean['Policy'], rotation=45, ha='right')
     ax4.axhline(y=100, color='green', linestyle='--', alpha=0.5, label='100% (ideal)')
     ax4.legend()
     ax4.grid(axis='y', alpha=0.3)
     ax4.set_ylim(0, 110)
 
     # Add value labels
-    for i, bar in enumerate(bars):
-        height = bar.get_height()
-        ax4.text(bar.get_x() + bar.get_width()/2., height,
-                f'{height:.1f}%',
-                ha='center', va='bottom', fontsize=8)
+    ax4.bar_label(bars, fmt='%.1f%%', padding=2, fontsize=8)
 
-    plt.tight_layout()
+    # Policy labels are shared across the panels, so only the bottom row shows them
+    for ax in axes[1]:
+        ax.set_xlabel('Policy', fontweight='bold')
+        ax.set_xticks(x)
+        ax.set_xticklabels(policies, rotation=45, ha='right')
 
     # Save plot
     output_file = f'{output_prefix}_overview.png'
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    fig.savefig(output_file, dpi=300)
+    plt.close(fig)
     print(f"\n✓ Saved overview plot: {output_file}")
 
     # Create second figure: Average RTT if available
     if 'Avg_RTT_ms' in df_clean.columns:
-        df_rtt = df_clean[df_clean['Avg_RTT_ms'] != 'N/A'].copy()
+        df_rtt = df_clean.dropna(subset=['Avg_RTT_ms'])
         if not df_rtt.empty:
-            df_rtt['Avg_RTT_ms'] = pd.to_numeric(df_rtt['Avg_RTT_ms'], errors='coerce')
-
-            fig2, ax = plt.subplots(figsize=(12, 6))
+            fig2, ax = plt.subplots(figsize=(12, 6), constrained_layout=True)
             bars = ax.bar(range(len(df_rtt)), df_rtt['Avg_RTT_ms'],
                          color='orange', alpha=0.7)
             ax.set_xlabel('Policy', fontweight='bold')
@@ -140,34 +183,56 @@ def create_plots(df, output_prefix='policy_results'):
             ax.grid(axis='y', alpha=0.3)
 
             # Add value labels
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height,
-                       f'{height:.0f}',
-                       ha='center', va='bottom', fontsize=9)
+            ax.bar_label(bars, fmt='%.0f', padding=2, fontsize=9)
 
-            plt.tight_layout()
             rtt_file = f'{output_prefix}_rtt.png'
-            plt.savefig(rtt_file, dpi=300, bbox_inches='tight')
+            fig2.savefig(rtt_file, dpi=300)
+            plt.close(fig2)
             print(f"✓ Saved RTT plot: {rtt_file}")
 
     # Create comparison table
-    fig3, ax = plt.subplots(figsize=(14, 8))
+    table_data = df_clean[['Policy', 'Bitrate_Sender_Mbps', 'Bitrate_Receiver_Mbps',
+                           'Transfer_Sender_MB', 'Transfer_Receiver_MB', 'Retransmissions']]
+    save_table_html(table_data, output_prefix)
+    if png_table:
+        save_table_png(table_data, output_prefix)
+
+def save_table_html(table_data, output_prefix='policy_results'):
+    """Write the summary table as a styled HTML page"""
+    table_data = table_data.rename(columns={
+        'Bitrate_Sender_Mbps': 'Bitrate Sender (Mbps)',
+        'Bitrate_Receiver_Mbps': 'Bitrate Receiver (Mbps)',
+        'Transfer_Sender_MB': 'Transfer Sender (MB)',
+        'Transfer_Receiver_MB': 'Transfer Receiver (MB)',
+    })
+    styler = (table_data.style
+              .hide(axis='index')
+              .format({'Retransmissions': '{:.0f}'}, precision=2)
+              .background_gradient(subset=table_data.columns[1:], cmap='Blues')
+              .set_caption('Traffic Shaping Policy Test Results Summary'))
+
+    table_file = f'{output_prefix}_table.html'
+    styler.to_html(table_file)
+    print(f"✓ Saved table: {table_file}")
+
+def save_table_png(table_data, output_prefix='policy_results'):
+    """Render the summary table to a PNG image"""
+    # Standalone figure, kept out of pyplot's figure registry
+    fig3 = Figure(figsize=(14, 8), constrained_layout=True)
+    FigureCanvasAgg(fig3)
+    ax = fig3.add_subplot()
     ax.axis('tight')
     ax.axis('off')
 
     # Prepare table data
-    table_data = df_clean[['Policy', 'Bitrate_Sender_Mbps', 'Bitrate_Receiver_Mbps',
-                           'Transfer_Sender_MB', 'Transfer_Receiver_MB', 'Retransmissions']].copy()
+    table_data = table_data.copy()
     table_data.columns = ['Policy', 'Bitrate\nSender\n(Mbps)', 'Bitrate\nReceiver\n(Mbps)',
                           'Transfer\nSender\n(MB)', 'Transfer\nReceiver\n(MB)', 'Retrans-\nmissions']
 
     # Format numbers
-    for col in table_data.columns[1:]:
-        if col == 'Retrans-\nmissions':
-            table_data[col] = table_data[col].apply(lambda x: f'{int(x)}')
-        else:
-            table_data[col] = table_data[col].apply(lambda x: f'{x:.2f}')
+    float_cols = table_data.columns[1:-1]
+    table_data[float_cols] = table_data[float_cols].apply(lambda col: col.map('{:.2f}'.format))
+    table_data['Retrans-\nmissions'] = table_data['Retrans-\nmissions'].astype('int64').astype(str)
 
     table = ax.table(cellText=table_data.values, colLabels=table_data.columns,
                     cellLoc='center', loc='center', bbox=[0, 0, 1, 1])
@@ -188,69 +253,73 @@ def create_plots(df, output_prefix='policy_results'):
             else:
                 table[(i, j)].set_facecolor('white')
 
-    plt.title('Traffic Shaping Policy Test Results Summary',
-              fontsize=14, fontweight='bold', pad=20)
+    ax.set_title('Traffic Shaping Policy Test Results Summary',
+                 fontsize=14, fontweight='bold', pad=20)
 
     table_file = f'{output_prefix}_table.png'
-    plt.savefig(table_file, dpi=300, bbox_inches='tight')
+    # Tables are plain text, they don't need print resolution
+    fig3.savefig(table_file, dpi=150)
     print(f"✓ Saved table: {table_file}")
 
-def print_summary(df):
+def print_summary(df_clean):
     """Print summary statistics"""
-    df_clean = df[df['Bitrate_Sender_Mbps'] != 'ERROR'].copy()
-    df_clean = df_clean[df_clean['Bitrate_Sender_Mbps'] != 'N/A'].copy()
-
-    numeric_cols = ['Bitrate_Sender_Mbps', 'Bitrate_Receiver_Mbps',
-                    'Transfer_Sender_MB', 'Transfer_Receiver_MB', 'Retransmissions']
-    for col in numeric_cols:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
+    # Work on the raw arrays; nanarg* skip missing values like idxmax/idxmin
+    policies = df_clean['Policy'].to_numpy()
+    receiver = df_clean['Bitrate_Receiver_Mbps'].to_numpy()
+    retransmissions = df_clean['Retransmissions'].to_numpy()
+    efficiency = df_clean['Efficiency'].to_numpy()
 
     print("\n" + "="*60)
     print("SUMMARY STATISTICS")
     print("="*60)
     print(f"\nFastest Policy (Receiver Bitrate):")
-    fastest = df_clean.loc[df_clean['Bitrate_Receiver_Mbps'].idxmax()]
-    print(f"  {fastest['Policy']}: {fastest['Bitrate_Receiver_Mbps']:.2f} Mbps")
+    fastest = np.nanargmax(receiver)
+    print(f"  {policies[fastest]}: {receiver[fastest]:.2f} Mbps")
 
     print(f"\nSlowest Policy (Receiver Bitrate):")
-    slowest = df_clean.loc[df_clean['Bitrate_Receiver_Mbps'].idxmin()]
-    print(f"  {slowest['Policy']}: {slowest['Bitrate_Receiver_Mbps']:.2f} Mbps")
+    slowest = np.nanargmin(receiver)
+    print(f"  {policies[slowest]}: {receiver[slowest]:.2f} Mbps")
 
     print(f"\nMost Retransmissions:")
-    most_retrans = df_clean.loc[df_clean['Retransmissions'].idxmax()]
-    print(f"  {most_retrans['Policy']}: {int(most_retrans['Retransmissions'])} retransmissions")
+    most_retrans = np.nanargmax(retransmissions)
+    print(f"  {policies[most_retrans]}: {int(retransmissions[most_retrans])} retransmissions")
 
     print(f"\nBest Efficiency (Receiver/Sender):")
-    df_clean['Efficiency'] = (df_clean['Bitrate_Receiver_Mbps'] / df_clean['Bitrate_Sender_Mbps'] * 100)
-    best_eff = df_clean.loc[df_clean['Efficiency'].idxmax()]
-    print(f"  {best_eff['Policy']}: {best_eff['Efficiency']:.2f}%")
+    best_eff = np.nanargmax(efficiency)
+    print(f"  {policies[best_eff]}: {efficiency[best_eff]:.2f}%")
 
     print("\n" + "="*60)
 
 def main():
     """Main function"""
-    # Check for CSV file
+    # Check for CSV file and --png (also render the summary table as an image)
+    args = sys.argv[1:]
+    png_table = '--png' in args
+    args = [arg for arg in args if arg != '--png']
     csv_file = 'policy_test_results.csv'
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
+    if args:
+        csv_file = args[0]
 
     print("Traffic Shaping Policy Results Visualization")
     print("=" * 60)
 
     # Load data
     df = load_data(csv_file)
+    df_clean = prepare(df)
 
     # Create plots
-    create_plots(df)
+    create_plots(df_clean, png_table=png_table)
 
     # Print summary
-    print_summary(df)
+    print_summary(df_clean)
 
     print("\n✓ Visualization complete!")
     print("\nGenerated files:")
     print("  - policy_results_overview.png  (4 charts)")
     print("  - policy_results_rtt.png       (RTT chart)")
-    print("  - policy_results_table.png     (Summary table)")
+    print("  - policy_results_table.html    (Summary table)")
+    if png_table:
+        print("  - policy_results_table.png     (Summary table image)")
 
 if __name__ == '__main__':
     main()
@@ -1,25 +1,45 @@
 #!/usr/bin/env python3
 
-from flask import Flask, request, jsonify
+from flask import Flask, request
 import subprocess
-import json
+import orjson
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
 current_policy = {"name": "none", "status": "inactive"}
 
-def run_command(cmd):
-    """Execute shell command and return result"""
+POLICIES_FILE = '/app/policies.json'
+
+# Parsed policies, re-read only when the file's mtime changes
+_policies_cache = {"mtime": None, "policies": {}}
+
+def json_response(payload, status=200):
+    """Serialize payload with orjson into a JSON response"""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+def load_policies():
+    """Return the policy definitions, reloading them if the file changed"""
+    mtime = os.stat(POLICIES_FILE).st_mtime_ns
+    if mtime != _policies_cache["mtime"]:
+        with open(POLICIES_FILE, 'rb') as f:
+            _policies_cache["policies"] = orjson.loads(f.read())
+        _policies_cache["mtime"] = mtime
+    return _policies_cache["policies"]
+
+def run_command(cmd, input=None):
+    """Execute a command (argv list, no shell) and return result"""
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=10)
+        result = subprocess.run(cmd, input=input, capture_output=True, text=True, timeout=10)
         return {"success": result.returncode == 0, "output": result.stdout, "error": result.stderr}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 def clear_shaping(interface="eth1"):
     """Remove all traffic shaping rules"""
-    run_command(f"tc qdisc del dev {interface} root 2>/dev/null || true")
+    # Fails harmlessly when no root qdisc is installed
+    run_command(["tc", "qdisc", "del", "dev", interface, "root"])
     return {"status": "cleared", "interface": interface}
 
 def apply_policy(policy_name, interface="eth1"):
@@ -34,9 +54,7 @@ def apply_policy(policy_name, interface="eth1"):
         current_policy = {"name": policy_name, "status": "active", "config": {"type": "none"}}
         return {"success": True, "policy": policy_name, "message": "No shaping applied"}
     
-    # Load policies from file
-    with open('/app/policies.json', 'r') as f:
-        policies = json.load(f)
+    policies = load_policies()
     
     if policy_name not in policies:
         return {"success": False, "error": f"Policy '{policy_name}' not found"}
@@ -45,37 +63,38 @@ def apply_policy(policy_name, interface="eth1"):
     
     # Apply the policy based on type
     if policy['type'] == 'cake':
-        cmd = f"tc qdisc add dev {interface} root cake bandwidth {policy['bandwidth']}"
+        cmd = ["tc", "qdisc", "add", "dev", interface, "root", "cake", "bandwidth", policy['bandwidth']]
         if 'rtt' in policy:
-            cmd += f" rtt {policy['rtt']}"
+            cmd += ["rtt", policy['rtt']]
         if 'features' in policy:
-            cmd += f" {' '.join(policy['features'])}"
+            cmd += policy['features']
     
     elif policy['type'] == 'netem':
-        cmd = f"tc qdisc add dev {interface} root netem"
+        cmd = ["tc", "qdisc", "add", "dev", interface, "root", "netem"]
         if 'delay' in policy:
-            cmd += f" delay {policy['delay']}"
+            cmd += ["delay", policy['delay']]
         if 'jitter' in policy:
-            cmd += f" {policy['jitter']}"
+            cmd += [policy['jitter']]
         if 'loss' in policy:
-            cmd += f" loss {policy['loss']}"
+            cmd += ["loss", policy['loss']]
         if 'rate' in policy:
-            cmd += f" rate {policy['rate']}"
+            cmd += ["rate", policy['rate']]
     
     elif policy['type'] == 'htb':
+        # tc batch lines, applied by a single `tc -batch -` process
         commands = []
-        commands.append(f"tc qdisc add dev {interface} root handle 1: htb default 30")
-        commands.append(f"tc class add dev {interface} parent 1: classid 1:1 htb rate {policy['total_bandwidth']}")
+        commands.append(f"qdisc add dev {interface} root handle 1: htb default 30")
+        commands.append(f"class add dev {interface} parent 1: classid 1:1 htb rate {policy['total_bandwidth']}")
         
         for i, class_cfg in enumerate(policy['classes'], start=10):
             classid = f"1:{i}"
-            commands.append(f"tc class add dev {interface} parent 1:1 classid {classid} htb rate {class_cfg['rate']} ceil {class_cfg.get('ceil', class_cfg['rate'])}")
-            commands.append(f"tc qdisc add dev {interface} parent {classid} handle {i}: fq_codel")
+            commands.append(f"class add dev {interface} parent 1:1 classid {classid} htb rate {class_cfg['rate']} ceil {class_cfg.get('ceil', class_cfg['rate'])}")
+            commands.append(f"qdisc add dev {interface} parent {classid} handle {i}: fq_codel")
         
-        for cmd in commands:
-            result = run_command(cmd)
-            if not result['success']:
-                return {"success": False, "error": result['error'], "command": cmd}
+        batch = "\n".join(commands) + "\n"
+        result = run_command(["tc", "-batch", "-"], input=batch)
+        if not result['success']:
+            return {"success": False, "error": result['error'], "command": batch}
         
         current_policy = {"name": policy_name, "status": "active", "config": policy}
         return {"success": True, "policy": policy_name, "type": "htb"}
@@ -88,21 +107,20 @@ def apply_policy(policy_name, interface="eth1"):
     
     if result['success']:
         current_policy = {"name": policy_name, "status": "active", "config": policy}
-        return {"success": True, "policy": policy_name, "command": cmd}
+        return {"success": True, "policy": policy_name, "command": " ".join(cmd)}
     else:
-        return {"success": False, "error": result['error'], "command": cmd}
+        return {"success": False, "error": result['error'], "command": " ".join(cmd)}
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "current_policy": current_policy})
+    return json_response({"status": "healthy", "current_policy": current_policy})
 
 @app.route('/policies', methods=['GET'])
 def list_policies():
     """List all available policies"""
-    with open('/app/policies.json', 'r') as f:
-        policies = json.load(f)
-    return jsonify({"policies": list(policies.keys()), "details": policies})
+    policies = load_policies()
+    return json_response({"policies": list(policies.keys()), "details": policies})
 
 @app.route('/policy/apply', methods=['POST'])
 def apply_policy_endpoint():
@@ -112,11 +130,11 @@ def apply_policy_endpoint():
     interface = data.get('interface', 'eth1')
     
     if not policy_name:
-        return jsonify({"success": False, "error": "Policy name required"}), 400
+        return json_response({"success": False, "error": "Policy name required"}, 400)
     
     result = apply_policy(policy_name, interface)
     status_code = 200 if result.get('success', False) else 400
-    return jsonify(result), status_code
+    return json_response(result, status_code)
 
 @app.route('/policy/clear', methods=['POST'])
 def clear_policy_endpoint():
@@ -126,13 +144,13 @@ def clear_policy_endpoint():
     interface = data.get('interface', 'eth1')
     result = clear_shaping(interface)
     current_policy = {"name": "none", "status": "inactive"}
-    return jsonify({"success": True, "result": result})
+    return json_response({"success": True, "result": result})
 
 @app.route('/policy/current', methods=['GET'])
 def get_current_policy():
     """Get currently applied policy"""
-    tc_result = run_command("tc qdisc show dev eth1")
-    return jsonify({
+    tc_result = run_command(["tc", "qdisc", "show", "dev", "eth1"])
+    return json_response({
         "current_policy": current_policy,
         "tc_status": tc_result['output']
     })
@@ -141,18 +159,24 @@ def get_current_policy():
 def get_stats():
     """Get traffic statistics"""
     interface = request.args.get('interface', 'eth1')
-    tc_stats = run_command(f"tc -s qdisc show dev {interface}")
-    return jsonify({
+    tc_stats = run_command(["tc", "-s", "qdisc", "show", "dev", interface])
+    return json_response({
         "interface": interface,
         "stats": tc_stats['output']
     })
 
 if __name__ == '__main__':
     # Setup initial networking
-    run_command("sysctl -w net.ipv4.ip_forward=1")
-    run_command("iptables -t nat -A POSTROUTING -o eth1 -j MASQUERADE 2>/dev/null || true")
-    run_command("iptables -A FORWARD -i eth0 -o eth1 -j ACCEPT 2>/dev/null || true")
-    run_command("iptables -A FORWARD -i eth1 -o eth0 -m state --state RELATED,ESTABLISHED -j ACCEPT 2>/dev/null || true")
+    # Independent commands, run concurrently; -w makes iptables wait for the
+    # xtables lock instead of failing when another rule is being added
+    setup_commands = [
+        ["sysctl", "-w", "net.ipv4.ip_forward=1"],
+        ["iptables", "-w", "-t", "nat", "-A", "POSTROUTING", "-o", "eth1", "-j", "MASQUERADE"],
+        ["iptables", "-w", "-A", "FORWARD", "-i", "eth0", "-o", "eth1", "-j", "ACCEPT"],
+        ["iptables", "-w", "-A", "FORWARD", "-i", "eth1", "-o", "eth0", "-m", "state", "--state", "RELATED,ESTABLISHED", "-j", "ACCEPT"],
+    ]
+    with ThreadPoolExecutor(max_workers=len(setup_commands)) as executor:
+        list(executor.map(run_command, setup_commands))
     
     print("Traffic Shaper Controller Starting...")
     print("Available at http://0.0.0.0:5000")
@@ -1,22 +1,26 @@
 #!/usr/bin/env python3
 
 import requests
-import subprocess
-import json
 import time
 import csv
 from datetime import datetime
 import sys
 
 class TrafficShapingTester:
-    def __init__(self, shaper_api_url="http://localhost:5000", iperf_duration=30):
+    def __init__(self, shaper_api_url="http://localhost:5000", iperf_api_url="http://localhost:5001",
+                 iperf_duration=30):
         self.shaper_api = shaper_api_url
+        self.iperf_api = iperf_api_url
         self.iperf_duration = iperf_duration
         self.results = []
+
+        # Reuse keep-alive connections to the shaper and iperf APIs across the suite
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4))
         
     def get_policies(self):
         """Retrieve all available policies"""
-        response = requests.get(f"{self.shaper_api}/policies")
+        response = self.session.get(f"{self.shaper_api}/policies")
         if response.status_code == 200:
             return response.json()['policies']
         else:
@@ -25,7 +29,7 @@ class TrafficShapingTester:
     def apply_policy(self, policy_name):
         """Apply a traffic shaping policy"""
         print(f"  Applying policy: {policy_name}")
-        response = requests.post(
+        response = self.session.post(
             f"{self.shaper_api}/policy/apply",
             json={"policy": policy_name}
         )
@@ -39,34 +43,36 @@ class TrafficShapingTester:
     def clear_policy(self):
         """Clear all traffic shaping"""
         print("  Clearing traffic shaping...")
-        requests.post(f"{self.shaper_api}/policy/clear")
+        self.session.post(f"{self.shaper_api}/policy/clear")
     
     def run_iperf_test(self, test_name):
         """Run iperf3 test through the shaper"""
         print(f"  Running iperf3 test (duration: {self.iperf_duration}s)...")
         
-        cmd = [
-            "docker", "exec", "iperf_client",
-            "iperf3", "-c", "172.21.0.3",
-            "-t", str(self.iperf_duration),
-            "-J"  # JSON output
-        ]
-        
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.iperf_duration + 10)
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                return self.parse_iperf_results(data, test_name)
-            else:
-                print(f"  ✗ iperf3 failed: {result.stderr}")
-                return None
-        except subprocess.TimeoutExpired:
+            response = self.session.post(
+                f"{self.iperf_api}/run",
+                params={"duration": self.iperf_duration},
+                timeout=self.iperf_duration + 10
+            )
+        except requests.exceptions.Timeout:
             print(f"  ✗ iperf3 timed out")
             return None
-        except json.JSONDecodeError as e:
+        except requests.exceptions.RequestException as e:
+            print(f"  ✗ iperf3 failed: {e}")
+            return None
+
+        if response.status_code != 200:
+            print(f"  ✗ iperf3 failed: {response.text}")
+            return None
+
+        try:
+            data = response.json()
+        except ValueError as e:
             print(f"  ✗ Failed to parse iperf3 output: {e}")
             return None
+
+        return self.parse_iperf_results(data, test_name)
     
     def parse_iperf_results(self, data, test_name):
         """Parse iperf3 JSON results"""
@@ -145,8 +151,7 @@ class TrafficShapingTester:
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             
             writer.writeheader()
-            for result in self.results:
-                writer.writerow(result)
+            writer.writerows(self.results)
         
         print(f"Results saved to {filename}")
     
@@ -173,18 +178,20 @@ class TrafficShapingTester:
 def main():
     # Configuration
     SHAPER_API = "http://localhost:5000"
+    IPERF_API = "http://localhost:5001"
     IPERF_DURATION = 30  # seconds per test
     WAIT_BETWEEN_TESTS = 5  # seconds
     
     # Create tester
     tester = TrafficShapingTester(
         shaper_api_url=SHAPER_API,
+        iperf_api_url=IPERF_API,
         iperf_duration=IPERF_DURATION
     )
     
     # Check if shaper is available
     try:
-        response = requests.get(f"{SHAPER_API}/health", timeout=5)
+        response = tester.session.get(f"{SHAPER_API}/health", timeout=5)
         if response.status_code != 200:
             print("Error: Traffic shaper API is not healthy")
             sys.exit(1)
@@ -193,6 +200,17 @@ def main():
         print(f"Make sure Docker containers are running: docker-compose up -d")
         sys.exit(1)
     
+    # Check if iperf client API is available
+    try:
+        response = tester.session.get(f"{IPERF_API}/health", timeout=5)
+        if response.status_code != 200:
+            print("Error: iperf client API is not healthy")
+            sys.exit(1)
+    except requests.exceptions.RequestException as e:
+        print(f"Error: Cannot connect to iperf client API at {IPERF_API}")
+        print(f"Make sure Docker containers are running: docker-compose up -d")
+        sys.exit(1)
+    
     # Run tests
     try:
         tester.run_test_suite(wait_between_tests=WAIT_BETWEEN_TESTS)